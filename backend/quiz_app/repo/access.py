@@ -24,10 +24,38 @@ class Access(ABC, Generic[T]):
         pass
 
 
+class TopicAccess(Access[models.Topic]):
+    def get_many(self, ids: list[str]) -> list[models.Topic]:
+        pass
+
+    def list_all(self) -> list[models.Topic]:
+        pass
+
+    def add_many(self, ms: list[models.Topic]) -> list[models.Topic]:
+        pass
+
+    def delete_all(self):
+        pass
+
+    def list_unique_questions(self, topic_ids: list[str]) -> list[models.Question]:
+        pass
+
+
+class QuizAccess(Access[models.Quiz]):
+    def get_problem(self, quiz_id: str, index: int) -> models.QuizProblem:
+        pass
+
+    def set_problem_status(self, quiz_id: str, index: int, status: models.ProblemAnswerStatus, answers: list[str]) -> int:
+        pass
+
+    def push_problem(self, quiz_id: str, problem: models.QuizProblem):
+        pass
+
+
 class AccessAPI:
-    topic: Access[models.Topic]
+    topic: TopicAccess
     question: Access[models.Question]
-    quiz: Access[models.Quiz]
+    quiz: QuizAccess
     # record: Access[models.Record]
 
 
@@ -5,12 +5,14 @@ if typing.TYPE_CHECKING:
     from pymongo.database import Database
     from pymongo.command_cursor import CommandCursor
 
+from pymongo import ASCENDING
+
 from .serialization import serialize, deserialize
 from .. import access
 from ...models import *
 
 
-class TopicAccess(access.Access[Topic]):
+class TopicAccess(access.TopicAccess):
 
     db: 'Database'
 
@@ -28,40 +30,83 @@ class TopicAccess(access.Access[Topic]):
     def list_ids(self) -> list[str]:
         return [
             topic['topic_id']
-            for topic in self.topics.find(projection=['topic_id'])
+            for topic in self.topics.find(
+                {}, projection={'_id': 0, 'topic_id': 1}, sort=[('topic_id', ASCENDING)])
         ]
 
     def get(self, id_: str) -> Topic:
-        cursor: 'CommandCursor' = self.topics.aggregate(pipeline=[
+        cursor = self._aggregate({'topic_id': id_}, limit=1)
+        return deserialize(Topic, cursor.next())
+
+    def get_many(self, ids: list[str]) -> list[Topic]:
+        cursor = self._aggregate({'topic_id': {'$in': ids}})
+        return [deserialize(Topic, raw) for raw in cursor]
+
+    def list_all(self) -> list[Topic]:
+        return [deserialize(Topic, raw) for raw in self._aggregate({})]
+
+    def list_unique_questions(self, topic_ids: list[str]) -> list[Question]:
+        # question numbers are unique-indexed, so a plain $in match is already de-duplicated
+        return [
+            deserialize(Question, raw)
+            for raw in self.questions.find({'topic_id': {'$in': topic_ids}}, projection={'_id': 0})
+        ]
+
+    def _aggregate(self, match: dict, limit: int | None = None) -> 'CommandCursor':
+        pipeline = [
+            {
+                '$match': match
+            },
+        ]
+        if limit is not None:
+            # cut before the join so $lookup runs at most `limit` times
+            pipeline.append({'$limit': limit})
+        pipeline.extend([
             {
-                '$match': {
-                    'topic_id': id_
+                '$project': {
+                    '_id': 0,
+                    'topic_id': 1,
+                    'name': 1,
                 }
             },
             {
                 '$lookup': {
                     'from': 'questions',
-                    'localField': 'topic_id',
-                    'foreignField': 'topic_id',
+                    'let': {'tid': '$topic_id'},
+                    'pipeline': [
+                        {'$match': {'$expr': {'$eq': ['$topic_id', '$$tid']}}},
+                        {'$project': {'_id': 0}},
+                    ],
                     'as': 'questions',
                 }
-            }
+            },
         ])
-        return deserialize(Topic, cursor.next())
+        return self.topics.aggregate(pipeline=pipeline, allowDiskUse=False)
 
     def add(self, m: Topic) -> Topic:
-        questions = m.questions
-        raw = serialize(m)
-        _id = self.topics.insert_one(raw).inserted_id
-        raw = self.topics.find_one({'_id': _id})
-
-        m = deserialize(Topic, raw)
-        for q in questions:
-            raw = serialize(q)
-            _id = self.questions.insert_one(raw).inserted_id
-            raw = self.questions.find_one({'_id': _id})
-            m.questions.append(deserialize(Question, raw))
-        return m
+        return self.add_many([m])[0]
+
+    def add_many(self, ms: list[Topic]) -> list[Topic]:
+        if not ms:
+            return []
+
+        raws = [serialize(m) for m in ms]
+        result = self.topics.insert_many(raws)
+        topics = []
+        for raw, _id in zip(raws, result.inserted_ids):
+            raw['_id'] = _id
+            topics.append(deserialize(Topic, raw))
+
+        # questions of every topic in one batched insert; the serialized dicts already hold every field
+        owners = [t for t, m in zip(topics, ms) for _ in m.questions]
+        raws = [serialize(q) for m in ms for q in m.questions]
+        if not raws:
+            return topics
+        result = self.questions.insert_many(raws, ordered=False)
+        for topic, raw, _id in zip(owners, raws, result.inserted_ids):
+            raw['_id'] = _id
+            topic.questions.append(deserialize(Question, raw))
+        return topics
 
     def update(self, m: Topic) -> Topic:
         raw = serialize(m)
@@ -73,6 +118,10 @@ class TopicAccess(access.Access[Topic]):
         # cascade delete
         self.questions.delete_many({'topic_id': id_})
 
+    def delete_all(self):
+        self.topics.delete_many({})
+        self.questions.delete_many({})
+
 
 class QuestionAccess(access.Access[Question]):
 
@@ -88,7 +137,8 @@ class QuestionAccess(access.Access[Question]):
     def list_ids(self) -> list[str]:
         return [
             topic['number']
-            for topic in self.questions.find(projection=['number'])
+            for topic in self.questions.find(
+                {}, projection={'_id': 0, 'number': 1}, sort=[('number', ASCENDING)])
         ]
 
     def get(self, id_: str) -> Question:
@@ -97,8 +147,7 @@ class QuestionAccess(access.Access[Question]):
 
     def add(self, m: Question) -> Question:
         raw = serialize(m)
-        _id = self.questions.insert_one(raw).inserted_id
-        raw = self.questions.find_one({'_id': _id})
+        raw['_id'] = self.questions.insert_one(raw).inserted_id
         return deserialize(Question, raw)
 
     def update(self, m: Question) -> Question:
@@ -110,7 +159,7 @@ class QuestionAccess(access.Access[Question]):
         self.questions.delete_many({'number': id_})
 
 
-class QuizAccess(access.Access[Quiz]):
+class QuizAccess(access.QuizAccess):
 
     db: 'Database'
 
@@ -124,17 +173,88 @@ class QuizAccess(access.Access[Quiz]):
     def list_ids(self) -> list[str]:
         return [
             topic['quiz_id']
-            for topic in self.quizzes.find(projection=['quiz_id'])
+            for topic in self.quizzes.find(
+                {}, projection={'_id': 0, 'quiz_id': 1}, sort=[('quiz_id', ASCENDING)])
         ]
 
     def get(self, id_: str) -> Quiz:
         raw = self.quizzes.find_one({'quiz_id': id_})
         return deserialize(Quiz, raw)
 
+    def get_problem(self, quiz_id: str, index: int) -> QuizProblem:
+        if index < 0:
+            # $slice would clamp an out-of-range negative skip to the start; $arrayElemAt yields nothing
+            raws = list(self.quizzes.aggregate([
+                {'$match': {'quiz_id': quiz_id}},
+                {'$project': {'_id': 0, 'problem': {'$arrayElemAt': ['$problems', index]}}},
+            ]))
+            if not raws or 'problem' not in raws[0]:
+                raise IndexError(index)
+            return deserialize(QuizProblem, raws[0]['problem'])
+        raw = self.quizzes.find_one(
+            {'quiz_id': quiz_id},
+            projection={'_id': 0, 'quiz_id': 1, 'problems': {'$slice': [index, 1]}},
+        )
+        problems = raw['problems']
+        if not problems:
+            raise IndexError(index)
+        return deserialize(QuizProblem, problems[0])
+
+    def set_problem_status(self, quiz_id: str, index: int, status: ProblemAnswerStatus, answers: list[str]) -> int:
+        if index < 0:
+            # positional paths cannot count from the end; problems are never removed,
+            # so resolving against the current length is stable
+            raws = list(self.quizzes.aggregate([
+                {'$match': {'quiz_id': quiz_id}},
+                {'$project': {'_id': 0, 'size': {'$size': '$problems'}}},
+            ]))
+            if not raws:
+                return 0
+            index += raws[0]['size']
+            if index < 0:
+                raise IndexError(index)
+        # only a still-unanswered problem is updated, so concurrent submits cannot both win
+        result = self.quizzes.update_one({
+            'quiz_id': quiz_id,
+            f'problems.{index}.status': serialize(ProblemAnswerStatus.NOT_ANSWERED),
+        }, {
+            '$set': {
+                f'problems.{index}.status': serialize(status),
+                f'problems.{index}.user_answer': serialize(answers),
+            }
+        })
+        return result.matched_count
+
+    def push_problem(self, quiz_id: str, problem: QuizProblem):
+        # a pending entry of the same question is replaced in place, so indices of other problems stay put;
+        # answered entries are kept and the problem is appended instead.
+        pending = {
+            '$elemMatch': {
+                'question.number': problem.question.number,
+                'status': serialize(ProblemAnswerStatus.NOT_ANSWERED),
+            }
+        }
+        raw = serialize(problem)
+        result = self.quizzes.update_one(
+            {'quiz_id': quiz_id, 'problems': pending},
+            {'$set': {'problems.$': raw}},
+        )
+        if result.matched_count:
+            return
+        # the guard keeps a concurrent push of the same question from adding a duplicate
+        result = self.quizzes.update_one(
+            {'quiz_id': quiz_id, 'problems': {'$not': pending}},
+            {'$push': {'problems': raw}},
+        )
+        if result.matched_count:
+            return
+        # no match either way: a concurrent push already added it, or the quiz does not exist
+        if self.quizzes.count_documents({'quiz_id': quiz_id}, limit=1) == 0:
+            raise KeyError(quiz_id)
+
     def add(self, m: Quiz) -> Quiz:
         raw = serialize(m)
-        _id = self.quizzes.insert_one(raw).inserted_id
-        raw = self.quizzes.find_one({'_id': _id})
+        raw['_id'] = self.quizzes.insert_one(raw).inserted_id
         return deserialize(Quiz, raw)
 
     def update(self, m: Quiz) -> Quiz:
@@ -143,4 +263,4 @@ class QuizAccess(access.Access[Quiz]):
         return deserialize(Quiz, raw)
 
     def delete(self, id_: str):
-        self.quizzes.delete_many({'number': id_})
+        self.quizzes.delete_many({'quiz_id': id_})
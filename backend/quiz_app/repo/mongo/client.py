@@ -9,6 +9,8 @@ from ..access import AccessAPI, Connection
 
 
 class MongoConnection(Connection):
+    # create_index is idempotent, but is still a round trip per call
+    __indexes_created__: bool = False
 
     def get_access_api(self) -> AccessAPI:
         if os.environ.get('MONGO_URI'):
@@ -22,7 +24,16 @@ class MongoConnection(Connection):
         api.question = QuestionAccess(db)
         api.quiz = QuizAccess(db)
 
-        db.questions.create_index([('number', ASCENDING)], unique=True)
-        db.questions.create_index([('topic_id', ASCENDING)])
+        if not MongoConnection.__indexes_created__:
+            self._create_indexes(db)
+            MongoConnection.__indexes_created__ = True
 
         return api
+
+    @staticmethod
+    def _create_indexes(db):
+        db.questions.create_index([('number', ASCENDING)], unique=True)
+        # also serves topic_id-only lookups through its prefix
+        db.questions.create_index([('topic_id', ASCENDING), ('number', ASCENDING)])
+        db.topics.create_index([('topic_id', ASCENDING)], unique=True)
+        db.quizzes.create_index([('quiz_id', ASCENDING)], unique=True)
@@ -1,6 +1,6 @@
 import dataclasses
-import json
-import string
+import re
+from datetime import datetime
 from enum import Enum
 from typing import Any, Callable, Type, TypeVar
 
@@ -9,23 +9,35 @@ from ...models import QuestionType, ProblemAnswerStatus
 
 T = TypeVar('T')
 
+_NATIVE_TYPES = (str, int, float, bool, datetime)
+_FIELD_NAMES: dict[Type, tuple[str, ...]] = {}
+
+
+def _field_names(tp: Type) -> tuple[str, ...]:
+    try:
+        return _FIELD_NAMES[tp]
+    except KeyError:
+        pass
+    names = _FIELD_NAMES[tp] = tuple(f.name for f in dataclasses.fields(tp))
+    return names
+
 
 class Serializer:
     __custom__: dict[Type, Callable[[Any], dict]] = None
+    # concrete type -> resolved custom func (None if there is none)
+    __resolved__: dict[Type, Callable[[Any], dict] | None] = None
 
     def serialize(self, obj: T) -> dict | list[dict] | str:
-        for cls, func in (self.__custom__ or {}).items():
-            if isinstance(obj, cls):
-                return func(obj)
+        func = self._resolve(type(obj))
+        if func is not None:
+            return func(obj)
 
         # default impl
-        try:
-            j = json.dumps(obj)
-            return json.loads(j)
-        except TypeError:
-            pass
+        # primitives (and datetimes) are encoded natively by bson
+        if obj is None or type(obj) in _NATIVE_TYPES:
+            return obj
         if isinstance(obj, dict):
-            return {k: serialize(v) for k, v in obj}
+            return {k: serialize(v) for k, v in obj.items()}
         if isinstance(obj, (list, tuple, set)):
             return [serialize(v) for v in obj]
         if isinstance(obj, Enum):
@@ -34,15 +46,30 @@ class Serializer:
             return str(obj)
 
         result = {}
-        for field in dataclasses.fields(obj):
-            field: dataclasses.Field
-            value = getattr(obj, field.name)
-            result[field.name] = serialize(value)
+        for name in _field_names(type(obj)):
+            result[name] = serialize(getattr(obj, name))
         return result
 
+    def _resolve(self, tp: Type) -> Callable[[Any], dict] | None:
+        if self.__resolved__ is None:
+            self.__resolved__ = {}
+        try:
+            return self.__resolved__[tp]
+        except KeyError:
+            pass
+
+        func = None
+        for cls, f in (self.__custom__ or {}).items():
+            if issubclass(tp, cls):
+                func = f
+                break
+        self.__resolved__[tp] = func
+        return func
+
     def register(self, *classes: Type[T]):
         if self.__custom__ is None:
             self.__custom__ = {}
+        self.__resolved__ = None
 
         def wrapper(func: Callable[[Any], dict]) -> Callable[[Any], dict]:
             for cls in classes:
@@ -77,6 +104,10 @@ _deserializer = Deserializer()
 serialize = _serializer.serialize
 deserialize = _deserializer.deserialize
 
+# plain dict lookups instead of Enum.__getitem__ on the per-document path
+_QUESTION_MODELS = {qt.name: qt.__qmodel__ for qt in QuestionType if hasattr(qt, '__qmodel__')}
+_ANSWER_STATUSES = {s.name: s for s in ProblemAnswerStatus}
+
 
 @_serializer.register(Enum)
 def _serialize_enum(e):
@@ -96,7 +127,7 @@ def _deserialize_topic(cls: Type[Topic], dict_: dict) -> Topic:
     dict_ = dict(dict_)
     if 'questions' in dict_:
         dict_['questions'] = [_deserialize_question(Question, q) for q in dict_['questions']]
-    del dict_['_id']
+    dict_.pop('_id', None)
     return Topic(**dict_)
 
 
@@ -105,10 +136,9 @@ def _deserialize_question(cls: Type[Question], dict_: dict) -> Question:
     dict_ = dict(dict_)
     if 'of_type' not in dict_:
         raise ValueError
-    question_type = QuestionType[dict_['of_type']]
-    if '_id' in dict_:
-        del dict_['_id']
-    return question_type.__qmodel__(**dict_)
+    model = _QUESTION_MODELS[dict_['of_type']]
+    dict_.pop('_id', None)
+    return model(**dict_)
 
 
 @_deserializer.register(Quiz)
@@ -116,7 +146,7 @@ def _deserialize_quiz(cls: Type[Quiz], dict_: dict) -> Quiz:
     dict_ = dict(dict_)
     if 'problems' in dict_:
         dict_['problems'] = [_deserialize_quiz_problem(QuizProblem, q) for q in dict_['problems']]
-    del dict_['_id']
+    dict_.pop('_id', None)
     return Quiz(**dict_)
 
 
@@ -124,7 +154,7 @@ def _deserialize_quiz(cls: Type[Quiz], dict_: dict) -> Quiz:
 def _deserialize_quiz_problem(cls: Type[QuizProblem], dict_: dict) -> QuizProblem:
     return QuizProblem(
         question=_deserialize_question(Question, dict_['question']),
-        status=ProblemAnswerStatus[dict_['status']],
+        status=_ANSWER_STATUSES[dict_['status']],
         user_answer=dict_.get('user_answer', []),
     )
 
@@ -137,26 +167,27 @@ def _process_dict(d: dict, key_func=lambda x: x, value_func=lambda x: x):
     for k, v in d.items():
         k = key_func(k)
         if isinstance(v, dict):
-            v = _process_dict(v)
+            v = _process_dict(v, key_func, value_func)
         elif isinstance(v, list):
-            v = [_process_dict(v2) for v2 in v]
+            v = [_process_dict(v2, key_func, value_func) for v2 in v]
         else:
             v = value_func(v)
         new[k] = v
     return new
 
 
-def _camel_to_snake(s: str) -> str:
-    for letter, repl in alphabet.items():
-        if letter in s:
-            s = s.replace(letter, repl)
-    return s
+_CAMEL_RE = re.compile(r'[A-Z]')
+# keys are drawn from a small set of field names, so this stays small
+_CAMEL_CACHE: dict[str, str] = {}
 
 
-alphabet = {
-    letter: '_' + letter.lower()
-    for letter in string.ascii_uppercase
-}
+def _camel_to_snake(s: str) -> str:
+    try:
+        return _CAMEL_CACHE[s]
+    except KeyError:
+        pass
+    snake = _CAMEL_CACHE[s] = _CAMEL_RE.sub(lambda m: '_' + m.group(0).lower(), s)
+    return snake
 
 
 def remove_camel(d: dict) -> dict:
@@ -1,18 +1,25 @@
 import dataclasses
+import io
 import itertools
+import math
+import multiprocessing
+import os
 import re
+import string
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from collections import defaultdict, namedtuple
 from enum import Enum
-from typing import Iterable, Iterator, TypeVar, Generic
+from typing import Iterable, Iterator
 
 from pdfminer.high_level import extract_pages
 from pdfminer.layout import LTPage, LTTextBox, LTChar, LAParams, LTComponent
+from pdfminer.pdfpage import PDFPage
 
 from quiz_app.models import Topic, Choice, QuestionType
 from quiz_app.models import Question, MultiAnswer, MultiChoice
 
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, slots=True)
 class Font:
     name: str
     size: str
@@ -28,22 +35,30 @@ class FontType(Enum):
     TEXT = Font('FBDPUN+FZSSK--GBK1-0', 10)
     OTHER = Font('', 0)
 
-    def char_matches(self, char: LTChar) -> bool:
-        font = self.value
-        if font.name != char.fontname:
-            return False
-        return abs(font.size - char.size) < 1e-3
-
     def textbox_matches(self, textbox: LTTextBox, mode=all) -> bool:
+        name, size = self.value.name, self.value.size
         return mode(
-            self.char_matches(c)
-            for line in textbox
-            for c in line
-            if isinstance(c, LTChar)
+            fontname == name and abs(size - fontsize) < 1e-3
+            for fontname, fontsize in _textbox_fonts(textbox)
         )
 
 
-@dataclasses.dataclass(frozen=True)
+def _textbox_fonts(textbox: LTTextBox) -> frozenset[tuple[str, float]]:
+    # a text box is checked against several font types; walk its chars only once
+    try:
+        return textbox._fonts
+    except AttributeError:
+        pass
+    fonts = textbox._fonts = frozenset(
+        (c.fontname, c.size)
+        for line in textbox
+        for c in line
+        if isinstance(c, LTChar)
+    )
+    return fonts
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
 class BBox:
     x0: int
     y0: int
@@ -73,35 +88,29 @@ class BBox:
     def contains(self, another: 'BBox') -> bool:
         return self.x0 < another.x0 and self.x1 > another.x1 and self.y0 < another.y0 and self.y1 > another.y1
 
+    def contains_element(self, element: LTComponent) -> bool:
+        # same as `self.contains(BBox.from_element(element))`, without the allocation
+        return (
+            self.x0 < int(element.x0) and self.x1 > int(element.x1)
+            and self.y0 < -int(element.y0) and self.y1 > -int(element.y1)
+        )
 
-T = TypeVar('T')
-
-
-class Peekable(Iterator[T]):
-
-    iter: Iterator[T]
-    cache: T | None
-
-    def __init__(self, iter: Iterator[T]):
-        self.iter = iter
-
-    def __iter__(self) -> Iterator[T]:
-        return self
-
-    def __next__(self) -> T:
-        if self.cache:
-            cached = self.cache
-            self.cache = None
-            return cached
-        return next(self.iter)
 
-    def peek(self) -> T:
-        if self.cache is None:
-            self.cache = next(self.iter)
-        return self.cache
+_CN_DIGITS = {c: i for i, c in enumerate('一二三四五六七八九', start=1)}
 
 
 def cn_num_convert(s: str) -> int:
+    # chapter and topic numbers are below 100: X, 十, 十X, X十, X十X
+    tens, sep, ones = s.rpartition('十')
+    try:
+        if not sep:
+            if len(s) == 1:
+                return _CN_DIGITS[s]
+        elif len(tens) <= 1 and len(ones) <= 1:
+            return (_CN_DIGITS[tens] if tens else 1) * 10 + (_CN_DIGITS[ones] if ones else 0)
+    except KeyError:
+        pass
+
     from cn2an import cn2an
     return cn2an(s, 'normal')
 
@@ -113,7 +122,44 @@ def get_filename():
     return sys.argv[1]
 
 
-@dataclasses.dataclass
+def extract_pages_parallel(file_name: str, max_workers: int | None = None) -> Iterator[LTPage]:
+    """
+    same pages as `extract_pages(file_name)`, in order, with layout analysis sharded across processes.
+    """
+    page_count = sum(1 for _ in PDFPage.get_pages(_read_in_memory(file_name)))
+    if page_count == 0:
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    chunk_size = -(-page_count // max_workers)
+    chunks = [list(range(i, min(i + chunk_size, page_count))) for i in range(0, page_count, chunk_size)]
+    # spawn rather than fork: the caller may already hold threads and sockets (e.g. a MongoClient)
+    mp_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+        for pages in executor.map(_extract_page_range, itertools.repeat(file_name), chunks):
+            yield from pages
+
+
+def _read_in_memory(file_name: str) -> io.BytesIO:
+    # one sequential read; pdfminer then seeks around xrefs and streams in memory
+    with open(file_name, 'rb') as f:
+        return io.BytesIO(f.read())
+
+
+def _extract_page_range(file_name: str, page_numbers: list[int]) -> list[LTPage]:
+    pages = []
+    fp = _read_in_memory(file_name)
+    for page_no, page in zip(page_numbers, extract_pages(fp, page_numbers=page_numbers)):
+        # pdfminer numbers pages from 1 on every call, so restore the global number
+        result = LTPage(page_no + 1, page.bbox, page.rotate)
+        # only text boxes are read further; other components (figures, images with their
+        # streams) are reduced to bare boxes to keep what goes back through pickle small.
+        result.extend(c if isinstance(c, LTTextBox) else LTComponent(c.bbox) for c in page)
+        pages.append(result)
+    return pages
+
+
+@dataclasses.dataclass(slots=True)
 class Cursor:
     page_no: int
     component: LTComponent = dataclasses.field(hash=False, compare=False)
@@ -123,7 +169,7 @@ class Cursor:
         return isinstance(self.component, LTTextBox)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class SectionCursor(Cursor):
     title: str | None = None
     section_title: str | None = None
@@ -178,10 +224,11 @@ def read_sections(pages: Iterator[LTPage]) -> Iterator[SectionCursor]:
 
 
 class ChapterReader(Iterator[Topic]):
-    CHAPTER_TITLE = r'第(?P<idx_cn>[一二三四五六七八九十]+)章\s*(?P<title>.*)\s*+'
-    TOPIC_TITLE = r'专题(?P<idx_cn>[一二三四五六七八九十]+)\s*(?P<title>.*)\s*+'
-    ANSWER_CHOICES = r'\s*([ABCD]+)\s+(.*)'
-    ANSWER_SHEET = r'[\sA-Z0-9\.]+'
+    CHAPTER_TITLE = re.compile(r'第(?P<idx_cn>[一二三四五六七八九十]+)章\s*(?P<title>.*)\s*+')
+    TOPIC_TITLE = re.compile(r'专题(?P<idx_cn>[一二三四五六七八九十]+)\s*(?P<title>.*)\s*+')
+    ANSWER_CHOICES = re.compile(r'\s*([ABCD]+)\s+(.*)', re.U)
+    # answer sheets hold only capital letters, digits, dots and whitespace
+    ANSWER_SHEET_DELETE = str.maketrans('', '', string.ascii_uppercase + string.digits + '.')
 
     # a helper class
     ChapterTitle = namedtuple('ChapterTitle', ('id_', 'title'))
@@ -212,22 +259,24 @@ class ChapterReader(Iterator[Topic]):
             question = question_type.new_question(index, '')
             question.topic_id = chapter.topic_id
 
+            # collect parts and join once
+            text_parts = []
             if question_type in (QuestionType.MULTI_CHOICE, QuestionType.MULTI_ANSWER):
-                choices = defaultdict(lambda: '')
+                choices = defaultdict(list)
                 choice = None
                 for line in lines:
-                    if line[0] in ('A', 'B', 'C', 'D') and line[1] == '.':
+                    if len(line) >= 2 and line[1] == '.' and 'A' <= line[0] <= 'D':
                         choice = line[0]
                         line = line[2:]
                     if choice is not None:
-                        choices[choice] += line.strip()
+                        choices[choice].append(line.strip())
                     else:
-                        question.text += line
-                question.choices = [Choice(c, t) for c, t in choices.items()]
+                        text_parts.append(line)
+                question.choices = [Choice(c, ''.join(parts)) for c, parts in choices.items()]
             else:
-                question.text += ''.join(lines)
+                text_parts.extend(lines)
 
-            question.text = ChapterReader._strip_text(index, question.text)
+            question.text = ChapterReader._strip_text(index, text_parts)
             qa.question_refs[index] = question
             chapter.questions.append(question)
 
@@ -242,7 +291,7 @@ class ChapterReader(Iterator[Topic]):
             text = ChapterReader._strip_text(index, ''.join(lines))
 
             if question_type in (QuestionType.MULTI_CHOICE, QuestionType.MULTI_ANSWER):
-                m = re.match(ChapterReader.ANSWER_CHOICES, text, re.U)
+                m = ChapterReader.ANSWER_CHOICES.match(text)
                 if not m:
                     raise RuntimeError
                 answer, _ = m.groups()
@@ -256,9 +305,16 @@ class ChapterReader(Iterator[Topic]):
 
         return chapter
 
+    @staticmethod
+    def _is_answer_sheet(text: str) -> bool:
+        rest = text.translate(ChapterReader.ANSWER_SHEET_DELETE)
+        return bool(text) and (not rest or rest.isspace())
+
     @staticmethod
     def _strip_text(index: str, lines: Iterable[str]) -> str:
-        text = ''.join(lines).replace('斯尔解析', '').strip()
+        # an already joined str would otherwise be re-joined char by char
+        text = lines if isinstance(lines, str) else ''.join(lines)
+        text = text.replace('斯尔解析', '').strip()
         if text.startswith(index):
             text = text[len(index):]
         text = text.strip()
@@ -338,7 +394,8 @@ class ChapterReader(Iterator[Topic]):
                 if not lines:
                     continue
                 if is_answer_phase:
-                    if re.fullmatch(self.ANSWER_SHEET, ''.join(lines), re.U):
+                    joined = ''.join(lines)
+                    if self._is_answer_sheet(joined):
                         # answer sheet, ignore for now
                         continue
                     qa.raw_answers[index].extend(lines)
@@ -346,7 +403,7 @@ class ChapterReader(Iterator[Topic]):
                     # infer question type
                     question_type = qa.question_types.get(index)
                     if question_type is None:
-                        m = re.match(self.ANSWER_CHOICES, self._strip_text(index, ''.join(lines)), re.U)
+                        m = self.ANSWER_CHOICES.match(self._strip_text(index, joined))
                         if not m:
                             question_type = QuestionType.SHORT_ANSWER
                         elif len(m.group(1)) == 1:
@@ -378,13 +435,13 @@ class ChapterReader(Iterator[Topic]):
         if title == '答案与解析':
             return None, True, False
 
-        m = re.match(self.CHAPTER_TITLE, title)
+        m = self.CHAPTER_TITLE.match(title)
         if m:
             attrs = m.groupdict()
             id_ = 'chapter-' + str(cn_num_convert(attrs['idx_cn']))
             title = attrs['title']
         else:
-            m = re.match(self.TOPIC_TITLE, title)
+            m = self.TOPIC_TITLE.match(title)
             if not m:
                 # title not match; ignore
                 return None, False, False
@@ -394,6 +451,10 @@ class ChapterReader(Iterator[Topic]):
         return self.ChapterTitle(id_=id_, title=title), False, False
 
 
+_PAGE_NUMBER = re.compile(r'·\s*\d+\s*·', re.U)
+_QUESTION_INDEX = re.compile(r'\s*(\d+\.\d+)+', re.U)
+
+
 def _read_indices(
         elements: Iterator[LTComponent],
         prev_index: str | None = None,
@@ -406,11 +467,22 @@ def _read_indices(
     if not is_sorted:
         elements.sort(key=lambda ele: (-int(ele.y0), int(ele.x0)))
 
-    try:
-        left_most = min(ele.x0 for ele in elements if isinstance(ele, LTTextBox))
-        right_most = max(ele.x1 for ele in elements if isinstance(ele, LTTextBox))
-        bottom = max(-ele.y1 for ele in elements if isinstance(ele, LTTextBox) and not re.match(r'·\s*\d+\s*·', ele.get_text(), re.U))
-    except ValueError:
+    # one pass for the text column bounds; texts are kept for the index scan below
+    text_boxes: list[tuple[LTTextBox, str]] = []
+    left_most, right_most, bottom = math.inf, -math.inf, -math.inf
+    for ele in elements:
+        if not isinstance(ele, LTTextBox):
+            continue
+        text = ele.get_text()
+        text_boxes.append((ele, text))
+        if ele.x0 < left_most:
+            left_most = ele.x0
+        if ele.x1 > right_most:
+            right_most = ele.x1
+        if -ele.y1 > bottom and not _PAGE_NUMBER.match(text):
+            bottom = -ele.y1
+    if bottom == -math.inf:
+        # no text besides page numbers
         return []
     if left_ref is not None and left_most > left_ref:
         left_most = left_ref
@@ -418,14 +490,12 @@ def _read_indices(
     delta = 5
     index_and_locations: list[tuple[str, BBox]] = []
 
-    for ele in elements:
-        if not isinstance(ele, LTTextBox):
-            continue
+    for ele, text in text_boxes:
         if ele.x0 > left_most + delta:
             continue
         if not FontType.INDEX.textbox_matches(ele, mode=any):
             continue
-        m = re.match(r'\s*(\d+\.\d+)+', ele.get_text(), flags=re.U)
+        m = _QUESTION_INDEX.match(text)
         if not m:
             continue
 
@@ -446,19 +516,19 @@ def _read_indices(
 
     result = defaultdict(list)
 
-    curr_idx, curr_bbox = index_and_locations.pop(0)
+    locations = iter(index_and_locations)
+    curr_idx, curr_bbox = next(locations)
     is_prev = True
     for ele in elements:
         while -ele.y0 > curr_bbox.y1:
             # box higher than ele
             is_prev = False
             try:
-                curr_idx, curr_bbox = index_and_locations.pop(0)
-            except IndexError:
+                curr_idx, curr_bbox = next(locations)
+            except StopIteration:
                 break
 
-        loc = BBox.from_element(ele)
-        if curr_bbox.contains(loc):
+        if curr_bbox.contains_element(ele):
             is_prev = False
             result[curr_idx].append(ele)
         elif is_prev and prev_index is not None:
@@ -493,17 +563,24 @@ if __name__ == '__main__':
     from quiz_app import repo
     repo_api = repo.new_connection().get_access_api()
     # clear DB
-    for chapter_id in repo_api.topic.list_ids():
-        repo_api.topic.delete(chapter_id)
+    repo_api.topic.delete_all()
 
-    for chapter in ChapterReader(extract_pages(file_name)):
-        print(chapter)
+    # a single writer thread inserts chapters in order while the next one is parsed;
+    # at most one insert is in flight, so parsing runs at most a chapter ahead
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        insert = None
+        for chapter in ChapterReader(extract_pages_parallel(file_name)):
+            print(chapter)
 
-        fdir = result_dir.joinpath(f'{chapter.topic_id}_{chapter.name}')
-        fdir.mkdir(exist_ok=True)
-        for question in chapter.questions:
-            fpath = fdir.joinpath(f'{question.number}.txt')
+            # one file per chapter, questions separated by a rule
+            fpath = result_dir.joinpath(f'{chapter.topic_id}_{chapter.name}.txt')
             with open(fpath, 'w', encoding='utf-8') as f:
-                f.write(pretty(question))
+                f.write('\n\n---\n\n'.join(pretty(question) for question in chapter.questions))
+
+            # surfaces an insert error before the next chapter is submitted
+            if insert is not None:
+                insert.result()
+            insert = writer.submit(repo_api.topic.add, chapter)
 
-        repo_api.topic.add(chapter)
+        if insert is not None:
+            insert.result()
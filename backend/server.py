@@ -53,12 +53,13 @@ class QuizDisplay(BaseModel):
     @classmethod
     def from_model(cls, quiz: Quiz) -> 'QuizDisplay':
         index = quiz.current_index
-        return QuizDisplay(
+        # fields come from an already-typed model, skip validation
+        return QuizDisplay.model_construct(
             quiz_id=quiz.quiz_id,
             name=quiz.name,
             topic_ids=quiz.topic_ids,
             size=quiz.size,
-            is_done=quiz.is_done,
+            is_done=(index == -1),
             current_index=index,
             create_time=quiz.create_time,
             update_time=quiz.update_time,
@@ -80,15 +81,16 @@ def get_question(number: str) -> Question:
 @app.put('/quiz')
 def new_quiz(param: NewQuizParam) -> QuizDisplay:
     # find questions of topics
+    topic_ids = repo.topic.list_ids()
     if 'all' in param.topics:
-        param.topics = repo.topic.list_ids()
-
-    questions = []
-    for topic_id in param.topics:
-        questions.extend(repo.topic.get(topic_id).questions)
+        param.topics = topic_ids
+    else:
+        # questions are queried by topic_id alone, so check the topics themselves exist
+        missing = set(param.topics).difference(topic_ids)
+        if missing:
+            raise HTTPException(status_code=404, detail=f'topic not found: {", ".join(sorted(missing))}')
 
-    # de-dup
-    questions = list({q.number: q for q in questions}.values())
+    questions = repo.topic.list_unique_questions(param.topics)
     # shrink
     if param.total_question is not None:
         random.shuffle(questions)
@@ -119,9 +121,8 @@ def get_quiz(quiz_id: str) -> QuizDisplay:
 
 @app.get('/quiz/{quiz_id}/{question_index}')
 def get_quiz_question(quiz_id: str, question_index: int) -> QuizProblem:
-    quiz = repo.quiz.get(quiz_id)
     try:
-        problem = quiz.problems[question_index]
+        problem = repo.quiz.get_problem(quiz_id, question_index)
     except IndexError:
         raise HTTPException(status_code=404, detail='question not found')
     if problem.status == ProblemAnswerStatus.NOT_ANSWERED:
@@ -132,10 +133,8 @@ def get_quiz_question(quiz_id: str, question_index: int) -> QuizProblem:
 
 @app.post('/quiz/{quiz_id}/{question_index}')
 def submit_quiz_question(quiz_id: str, question_index: int, answers: list[str]) -> QuizProblem:
-    quiz = repo.quiz.get(quiz_id)
-
     try:
-        problem = quiz.problems[question_index]
+        problem = repo.quiz.get_problem(quiz_id, question_index)
     except IndexError:
         raise HTTPException(status_code=404, detail='question not found')
 
@@ -151,28 +150,18 @@ def submit_quiz_question(quiz_id: str, question_index: int, answers: list[str])
         problem.status = ProblemAnswerStatus.CORRECT
     else:
         problem.status = ProblemAnswerStatus.INCORRECT
-        update_all_wrong_answer_quiz(problem.question)
 
-    repo.quiz.update(quiz)
+    # the index was resolved by get_problem above, so only a lost race is left to report
+    matched = repo.quiz.set_problem_status(quiz_id, question_index, problem.status, answers)
+    if not matched:
+        # answered (or removed) since it was read above
+        raise HTTPException(status_code=400, detail='question already answered')
+    if not is_correct:
+        # after the status write, so answering within all_wrong itself is not clobbered
+        update_all_wrong_answer_quiz(problem.question)
     return problem
 
 
 def update_all_wrong_answer_quiz(question: Question):
     quiz_id = 'all_wrong'
-    quiz = repo.quiz.get(quiz_id)
-
-    # de-dup
-    # for this version of Python all dicts are ordered, so orders are reserved.
-    question_map = {}
-    for i, q in enumerate(quiz.problems):
-        if q.status == ProblemAnswerStatus.NOT_ANSWERED:
-            key = q.question.number
-        else:
-            key = (q.question.number, i)
-        if key not in question_map:
-            question_map[key] = q
-    # replace or insert at the back
-    question_map[question.number] = QuizProblem(question)
-
-    quiz.problems = list(question_map.values())
-    repo.quiz.update(quiz)
+    repo.quiz.push_problem(quiz_id, QuizProblem(question))